@@ -1,26 +1,63 @@
+import hashlib
+import hmac
 import os
-from datetime import datetime, date, timedelta
+import secrets
+from datetime import datetime, date, timedelta, time as dt_time
+from collections import namedtuple
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from time import monotonic
+from types import SimpleNamespace
+from flask import Flask, render_template, request, redirect, url_for, flash, session, abort
+from flask_caching import Cache
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from markupsafe import Markup
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import load_only, raiseload
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import check_password_hash
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
+# Render/Azure ponen un proxy delante: remote_addr debe ser la IP real del cliente (rate limit de /login)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
+# Render entrega postgres://...; SQLAlchemy 2.x no lo acepta y usamos el driver psycopg 3
+if DATABASE_URL and DATABASE_URL.startswith(("postgres://", "postgresql://")):
+    DATABASE_URL = "postgresql+psycopg://" + DATABASE_URL.split("://", 1)[1]
 
 app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Pool de conexiones para Postgres (Render corta conexiones TCP inactivas a los ~300s)
+if DATABASE_URL and not DATABASE_URL.startswith("sqlite"):
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": 20,
+        "max_overflow": 30,
+        "pool_pre_ping": True,
+        "pool_recycle": 280,
+        "pool_timeout": 30,
+    }
+
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret-key")
 
 db = SQLAlchemy(app)
+# El esquema se gestiona con migraciones: `flask --app app db upgrade` en el deploy
+migrate = Migrate(app, db)
+
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache"})
 
+def run_blocking(fn, *args):
+    """Ejecuta trabajo pesado de CPU en el threadpool de gevent para no bloquear el event loop."""
+    try:
+        from gevent import get_hub, monkey
+    except ImportError:
+        return fn(*args)
+    if not monkey.is_module_patched("threading"):
+        return fn(*args)
+    return get_hub().threadpool.apply(fn, args)
 
-with app.app_context():
-    db.create_all()
-    
 # ---------------------------
 # MODELS
 # ---------------------------
@@ -29,10 +66,22 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(120), unique=True, nullable=False)
     pin_hash = db.Column(db.String(256), nullable=False)  # hashed PIN
+    pin_salt = db.Column(db.String(32), nullable=True)  # NULL = hash pbkdf2 antiguo
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    def _hmac_pin(self, pin_plain):
+        # Un PIN de 4 dígitos no gana nada con pbkdf2; la protección real es el rate limit de /login
+        key = app.config["SECRET_KEY"].encode()
+        return hmac.new(key, (self.pin_salt + pin_plain).encode(), hashlib.sha256).hexdigest()
+
+    def set_pin(self, pin_plain):
+        self.pin_salt = secrets.token_hex(16)
+        self.pin_hash = self._hmac_pin(pin_plain)
+
     def verify_pin(self, pin_plain):
-        return check_password_hash(self.pin_hash, pin_plain)
+        if self.pin_salt is None:
+            return run_blocking(check_password_hash, self.pin_hash, pin_plain)
+        return hmac.compare_digest(self.pin_hash, self._hmac_pin(pin_plain))
 
     def __repr__(self):
         return f"<User {self.username}>"
@@ -40,12 +89,15 @@ class User(db.Model):
 
 class Event(db.Model):
     __tablename__ = "Events"
+    __table_args__ = (
+        db.Index("ix_event_user_date_time_id", "user_id", "date", "time", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("Users.id"), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    date = db.Column(db.String(50), nullable=True)  # ISO date YYYY-MM-DD
-    time = db.Column(db.String(20), nullable=True)  # hh:mm
+    date = db.Column(db.Date, nullable=True, index=True)
+    time = db.Column(db.Time, nullable=True)
     link = db.Column(db.String(500), nullable=True)
     urgent = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -67,26 +119,63 @@ def parse_iso_date(s):
         except Exception:
             return None
 
+def parse_hhmm_time(s):
+    if not s:
+        return None
+    try:
+        return datetime.strptime(s, "%H:%M").time()
+    except Exception:
+        try:
+            return datetime.strptime(s, "%H:%M:%S").time()
+        except Exception:
+            return None
+
+EVENTS_PAGE_SIZE = 50
+
+def make_cursor(event):
+    """Cursor de paginación "fecha,hora,id" (vacío = sin fecha/hora) del último evento de la página."""
+    d = event.date.isoformat() if event.date else ""
+    t = event.time.isoformat() if event.time else ""
+    return f"{d},{t},{event.id}"
+
+def parse_cursor(s):
+    if not s:
+        return None
+    try:
+        d, t, i = s.split(",")
+        return (
+            date.fromisoformat(d) if d else None,
+            dt_time.fromisoformat(t) if t else None,
+            int(i),
+        )
+    except ValueError:
+        return None
+
+# Fecha de la última limpieza en este proceso (los eventos solo "caducan" al cambiar el día)
+_last_cleanup_date = None
+
 def clean_past_events():
     """Elimina eventos con fecha anterior a hoy (solo si tienen fecha válida)."""
-    today = date.today()
-    to_delete = []
-    for e in Event.query.all():
-        d = parse_iso_date(e.date)
-        if d and d < today:
-            to_delete.append(e)
-    if to_delete:
-        for e in to_delete:
-            db.session.delete(e)
-        db.session.commit()
-        app.logger.info(f"Limpiados {len(to_delete)} eventos pasados.")
+    # Un solo DELETE en la BD; los eventos sin fecha (NULL) no entran en la comparación
+    deleted = Event.query.filter(Event.date < date.today()).delete(synchronize_session=False)
+    db.session.commit()
+    if deleted:
+        app.logger.info(f"Limpiados {deleted} eventos pasados.")
 
-with app.app_context():
-    db.create_all()
-    try:
-        clean_past_events()
-    except Exception as ex:
-        app.logger.exception("Error limpiando eventos pasados: %s", ex)
+DAYS_LABELS = {-1: "Venció", 0: "Hoy", 1: "Mañana"}
+
+# Vista de solo lectura para la plantilla: no se tocan las instancias ORM
+EventView = namedtuple("EventView", "event days_left days_label is_very_near")
+
+def days_label(delta):
+    """Etiqueta amigable para `delta` días hasta el evento."""
+    if delta is None:
+        return None
+    return DAYS_LABELS.get(delta) or (f"En {delta} días" if delta > 1 else "Venció")
+
+def make_event_view(event, is_very_near, today_ord):
+    delta = event.date.toordinal() - today_ord if event.date else None
+    return EventView(event, delta, days_label(delta), is_very_near)
 
 # ---------------------------
 # Auth helpers
@@ -101,10 +190,57 @@ def login_required(f):
     return decorated
 
 def get_current_user():
+    """Usuario de la sesión (id + username) sin consultar la BD en cada request."""
     uid = session.get("user_id")
     if not uid:
         return None
-    return User.query.get(uid)
+    username = session.get("username")
+    if username is None:
+        # sesiones antiguas sin username: se carga una vez y se guarda
+        user = User.query.get(uid)
+        if not user:
+            return None
+        username = session["username"] = user.username
+    return SimpleNamespace(id=uid, username=username)
+
+# Rate limit en memoria para /login: máximo de intentos por (usuario, IP) y por usuario (todas las IPs)
+# dentro de la ventana. Es por proceso: con N workers los límites efectivos se multiplican por N.
+LOGIN_MAX_FAILURES = 5
+LOGIN_MAX_FAILURES_PER_USER = 50
+LOGIN_WINDOW_SECONDS = 300
+LOGIN_MAX_TRACKED = 10000
+_login_failures = {}
+
+def _prune_login_failures(now):
+    for key in [k for k, ts in _login_failures.items() if now - ts[-1] >= LOGIN_WINDOW_SECONDS]:
+        del _login_failures[key]
+    # si sigue lleno (muchas claves activas a la vez) se descartan las menos recientes
+    while len(_login_failures) >= LOGIN_MAX_TRACKED * 9 // 10:
+        del _login_failures[next(iter(_login_failures))]
+
+def _register_login_attempt(username, ip):
+    """Anota el intento ANTES de verificar el PIN; devuelve False si algún límite ya está agotado.
+
+    Hay dos cubetas: (usuario, IP) con LOGIN_MAX_FAILURES, para no bloquear al dueño por
+    los fallos de otros, y (usuario, None) con LOGIN_MAX_FAILURES_PER_USER sumando todas
+    las IPs, para que repartir los intentos entre muchas IPs no recorra los 10 000 PINs.
+    Entre la comprobación y el registro no hay I/O, así que bajo gevent dos requests
+    concurrentes no pueden pasar ambos el límite.
+    """
+    now = monotonic()
+    buckets = [
+        (key, limit, [t for t in _login_failures.pop(key, ()) if now - t < LOGIN_WINDOW_SECONDS])
+        for key, limit in (((username, ip), LOGIN_MAX_FAILURES), ((username, None), LOGIN_MAX_FAILURES_PER_USER))
+    ]
+    allowed = all(len(attempts) < limit for _, limit, attempts in buckets)
+    if allowed and len(_login_failures) >= LOGIN_MAX_TRACKED:
+        _prune_login_failures(now)
+    for key, _, attempts in buckets:
+        if allowed:
+            attempts.append(now)
+        if attempts:
+            _login_failures[key] = attempts
+    return allowed
 
 @app.context_processor
 def inject_user():
@@ -132,8 +268,8 @@ def register():
             flash("Ya existe ese usuario.", "error")
             return redirect(url_for("register"))
 
-        hashed = generate_password_hash(pin, method="pbkdf2:sha256", salt_length=8)
-        user = User(username=username, pin_hash=hashed)
+        user = User(username=username)
+        user.set_pin(pin)
         db.session.add(user)
         db.session.commit()
         flash("Usuario creado. Ya puedes iniciar sesión.", "success")
@@ -147,12 +283,24 @@ def login():
         username = request.form.get("username", "").strip()
         pin = request.form.get("pin", "").strip()
 
+        if not _register_login_attempt(username, request.remote_addr):
+            flash("Demasiados intentos. Espera unos minutos.", "error")
+            return redirect(url_for("login"))
+
         user = User.query.filter_by(username=username).first()
         if not user or not user.verify_pin(pin):
             flash("Usuario o PIN inválido.", "error")
             return redirect(url_for("login"))
 
+        # solo se limpia la cubeta de esta IP: el tope global del usuario sigue contando
+        _login_failures.pop((username, request.remote_addr), None)
+        if user.pin_salt is None:
+            # migra el hash pbkdf2 antiguo al esquema HMAC
+            user.set_pin(pin)
+            db.session.commit()
+
         session["user_id"] = user.id
+        session["username"] = user.username
         flash(f"Bienvenido {user.username} ✔", "success")
         return redirect(url_for("index"))
 
@@ -161,66 +309,103 @@ def login():
 @app.route("/logout")
 def logout():
     session.pop("user_id", None)
+    session.pop("username", None)
     flash("Sesión cerrada.", "info")
     return redirect(url_for("login"))
 
 # ---------------------------
 # APP ROUTES (protegidos)
 # ---------------------------
+def _after_time(t, event_id):
+    """Eventos de la misma fecha posteriores a (hora, id) en orden hora NULLS LAST, id."""
+    if t is None:
+        return and_(Event.time.is_(None), Event.id > event_id)
+    return or_(Event.time > t, Event.time.is_(None), and_(Event.time == t, Event.id > event_id))
+
+def render_events_list(user_id, today, cursor_arg):
+    """HTML del listado de eventos de una página (fragmento cacheable de index)."""
+    # Primero los urgentes de los próximos 3 días (solo en la primera página) y después el resto
+    # paginado por keyset sobre (fecha, hora, id) con NULLs al final. Sin CASE ni COALESCE en el
+    # ORDER BY, ix_event_user_date_time_id sirve tanto el orden como el corte del cursor.
+    near_threshold = today + timedelta(days=3)
+    page_order = (Event.date, Event.time.asc().nulls_last(), Event.id)
+    base = (
+        select(Event)
+        .options(
+            # solo las columnas que pinta la plantilla; cualquier carga perezosa (N+1) falla
+            load_only(
+                Event.id, Event.title, Event.description, Event.date, Event.time, Event.link, Event.urgent,
+                raiseload=True,
+            ),
+            raiseload("*"),
+        )
+        .where(Event.user_id == user_id)
+    )
+    rest = base.where(or_(
+        Event.urgent.isnot(True), Event.date.is_(None), Event.date < today, Event.date > near_threshold,
+    ))
+
+    cursor = parse_cursor(cursor_arg)
+    very_near = []
+    if cursor is None:
+        very_near = db.session.scalars(
+            base.where(Event.urgent.is_(True), Event.date.between(today, near_threshold)).order_by(*page_order)
+        ).all()
+
+    # eventos con fecha: `date >= d` acota el rango del índice; los sin fecha van detrás (date IS NULL)
+    limit = EVENTS_PAGE_SIZE + 1
+    rows = []
+    if cursor is None or cursor[0] is not None:
+        dated = rest.where(Event.date.isnot(None))
+        if cursor:
+            d, t, event_id = cursor
+            dated = dated.where(Event.date >= d, or_(Event.date > d, and_(Event.date == d, _after_time(t, event_id))))
+        rows = db.session.scalars(dated.order_by(*page_order).limit(limit)).all()
+    if len(rows) < limit:
+        undated = rest.where(Event.date.is_(None))
+        if cursor and cursor[0] is None:
+            undated = undated.where(_after_time(cursor[1], cursor[2]))
+        rows += db.session.scalars(undated.order_by(*page_order).limit(limit - len(rows))).all()
+
+    events_page = rows[:EVENTS_PAGE_SIZE]
+    next_cursor = make_cursor(events_page[-1]) if len(rows) > EVENTS_PAGE_SIZE else None
+
+    today_ord = today.toordinal()
+    views = [make_event_view(e, True, today_ord) for e in very_near]
+    views += [make_event_view(e, False, today_ord) for e in events_page]
+
+    return render_template("_events.html", events=views, next_cursor=next_cursor)
+
 @app.route("/")
 @login_required
 def index():
-    # Limpieza ligera
-    try:
-        clean_past_events()
-    except Exception:
-        pass
+    # Limpieza ligera: como mucho una vez al día por proceso
+    global _last_cleanup_date
+    today = date.today()
+    if _last_cleanup_date != today:
+        try:
+            clean_past_events()
+            _last_cleanup_date = today
+        except Exception:
+            db.session.rollback()
 
     user = get_current_user()
     if not user:
         flash("Usuario no encontrado en sesión.", "error")
         return redirect(url_for("login"))
 
-    # traer solo eventos del usuario
-    all_events = Event.query.filter_by(user_id=user.id).order_by(Event.date, Event.time, Event.created_at.desc()).all()
+    # El fragmento solo cambia si cambian los eventos del usuario (alta/baja), el día o la página
+    cursor_arg = request.args.get("cursor", "")
+    count, last_created = db.session.execute(
+        select(func.count(Event.id), func.max(Event.created_at)).where(Event.user_id == user.id)
+    ).one()
+    cache_key = f"idx:{user.id}:{today.isoformat()}:{count}:{last_created}:{cursor_arg}"
+    events_html = cache.get(cache_key)
+    if events_html is None:
+        events_html = render_events_list(user.id, today, cursor_arg)
+        cache.set(cache_key, events_html, timeout=300)
 
-    today = date.today()
-    near_threshold = today + timedelta(days=3)
-
-    very_near_urgent = []
-    other_events = []
-    for e in all_events:
-        e_date = parse_iso_date(e.date)
-        is_very_near = False
-        days_left = None
-        days_label = None
-
-        if e_date:
-            days_left = (e_date - today).days
-            if days_left < 0:
-                days_label = "Venció"
-            elif days_left == 0:
-                days_label = "Hoy"
-            elif days_left == 1:
-                days_label = "Mañana"
-            else:
-                days_label = f"En {days_left} días"
-            if e.urgent and 0 <= days_left <= 3:
-                is_very_near = True
-
-        setattr(e, "_is_very_near", is_very_near)
-        setattr(e, "_days_left", days_left)
-        setattr(e, "_days_label", days_label)
-
-        if is_very_near:
-            very_near_urgent.append(e)
-        else:
-            other_events.append(e)
-
-    events_ordered = very_near_urgent + other_events
-    urgent_events = [e for e in events_ordered if e.urgent][:5]
-
-    return render_template("index.html", events=events_ordered, urgent_events=urgent_events)
+    return render_template("index.html", events_html=Markup(events_html))
 
 @app.route("/add", methods=["GET", "POST"])
 @login_required
@@ -230,7 +415,7 @@ def add_event():
         title = request.form.get("title")
         description = request.form.get("description")
         date_str = request.form.get("date")
-        time = request.form.get("time")
+        time_str = request.form.get("time")
         link = request.form.get("link")
         urgent = True if request.form.get("urgent") == "on" else False
 
@@ -238,16 +423,22 @@ def add_event():
             flash("El título es obligatorio", "error")
             return redirect(url_for("index"))
 
-        if date_str and parse_iso_date(date_str) is None:
+        event_date = parse_iso_date(date_str)
+        if date_str and event_date is None:
             flash("Formato de fecha inválido. Usa YYYY-MM-DD.", "error")
             return redirect(url_for("add_event"))
 
+        event_time = parse_hhmm_time(time_str)
+        if time_str and event_time is None:
+            flash("Formato de hora inválido. Usa HH:MM.", "error")
+            return redirect(url_for("add_event"))
+
         event = Event(
             user_id=user.id,
             title=title,
             description=description,
-            date=date_str or None,
-            time=time or None,
+            date=event_date,
+            time=event_time,
             link=link or None,
             urgent=urgent
         )
@@ -262,11 +453,10 @@ def add_event():
 @login_required
 def delete_event(event_id):
     user = get_current_user()
-    event = Event.query.get_or_404(event_id)
-    if event.user_id != user.id:
-        flash("No tienes permiso para eliminar este evento.", "error")
-        return redirect(url_for("index"))
-    db.session.delete(event)
+    # un solo DELETE filtrado por dueño: eventos ajenos o inexistentes dan el mismo 404
+    deleted = Event.query.filter_by(id=event_id, user_id=user.id).delete(synchronize_session=False)
+    if not deleted:
+        abort(404)
     db.session.commit()
     flash("Evento eliminado 🗑️", "info")
     return redirect(url_for("index"))
@@ -1,9 +1,19 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
 import os
+import sys
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
+if not DATABASE_URL:
+    sys.exit("DATABASE_URL no está definida.")
+if DATABASE_URL.startswith(("postgres://", "postgresql://")):
+    DATABASE_URL = "postgresql+psycopg://" + DATABASE_URL.split("://", 1)[1]
 
-engine = create_engine(DATABASE_URL)
-with engine.connect() as conn:
-    result = conn.execute(text("SELECT 1"))
-    print("Conexión OK:", result.scalar())
+# Chequeo puntual: sin pool (una sola conexión) y con timeout corto
+engine = create_engine(DATABASE_URL, poolclass=NullPool, connect_args={"connect_timeout": 3})
+try:
+    with engine.connect() as conn:
+        result = conn.execute(text("SELECT 1"))
+        print("Conexión OK:", result.scalar())
+finally:
+    engine.dispose()
\ No newline at end of file
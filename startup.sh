@@ -0,0 +1,6 @@
+#!/bin/sh
+# Arranque en Azure App Service (startup-command del workflow): primero las migraciones,
+# porque los workers ya no crean tablas; en Render lo hace la línea `release` del Procfile.
+set -e
+flask --app app db upgrade
+exec gunicorn wsgi:app -k gevent --workers 2 --worker-connections 500 --bind "0.0.0.0:${PORT:-8000}"
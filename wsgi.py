@@ -0,0 +1,7 @@
+# Punto de entrada para gunicorn con workers gevent.
+# El monkey-patch tiene que ocurrir antes de importar la app (y con ella SQLAlchemy/psycopg).
+# psycopg 3 espera en sockets de Python, así que con el monkey-patch ya coopera con gevent.
+from gevent import monkey
+monkey.patch_all()
+
+from app import app  # noqa: E402